@@ -1,9 +1,10 @@
 """Browser extension views."""
-import copy
 import logging
 from operator import itemgetter
+import threading
 
-from flask import jsonify, make_response, request
+from cachetools import TTLCache
+from flask import make_response, request
 from flask.views import View
 from google.cloud import ndb
 from granary import as1
@@ -11,7 +12,6 @@ from oauth_dropins.webutil import flask_util
 from oauth_dropins.webutil.util import json_dumps, json_loads
 
 from flask_app import app
-import models
 from models import Activity, Domain, Source
 import util
 
@@ -22,23 +22,99 @@ JSON_CONTENT_TYPE = 'application/json'
 # See https://www.cloudimage.io/
 IMAGE_PROXY_URL_BASE = 'https://aujtzahimq.cloudimg.io/v7/'
 
+# in-process cache of token => tuple of domain ids, since the browser extension
+# polls these endpoints often and tokens rarely change. only non-empty results
+# are cached so that newly registered tokens work right away.
+TOKEN_DOMAINS_CACHE_SIZE = 4096
+TOKEN_DOMAINS_CACHE_TTL = 60  # seconds
+token_domains_cache_lock = threading.RLock()
+token_domains_cache = TTLCache(TOKEN_DOMAINS_CACHE_SIZE, TOKEN_DOMAINS_CACHE_TTL)
 
-def merge_by_id(existing, updates):
+
+def merge_by_id(existing, updates, sort=True):
   """Merges two lists of AS1 objects by id.
 
   Overwrites the objects in the existing list with objects in the updates list
   with the same id. Requires all objects to have ids.
 
+  Objects are sorted by id by default. If ``sort`` is False, they're returned
+  in the order their ids first appear in ``existing`` and then ``updates``.
+
   Args:
     existing (list of dict): AS1 objects
     updates (list of dict): AS1 objects
+    sort (bool): whether to sort the merged objects by id, default True
 
   Returns:
     list of dict: merged objects
   """
-  objs = {o['id']: o for o in existing}
-  objs.update({o['id']: o for o in updates})
-  return sorted(objs.values(), key=itemgetter('id'))
+  objs = {}
+  for obj in existing:
+    objs[obj['id']] = obj
+  for obj in updates:
+    objs[obj['id']] = obj
+
+  merged = list(objs.values())
+  if sort:
+    merged.sort(key=itemgetter('id'))
+  return merged
+
+
+def tag_uri_has_id(uri, id):
+  """Returns True if a tag URI's id, ie the part after the date, is ``id``.
+
+  Checks the URI's suffix first so that we only regex parse likely matches.
+
+  Args:
+    uri (str): tag URI, eg ``tag:instagram.com,2013:123_456``
+    id (str)
+
+  Returns:
+    bool:
+  """
+  if not uri.endswith(f':{id}'):
+    return False
+
+  parsed = util.parse_tag_uri(uri)
+  return bool(parsed) and parsed[1] == id
+
+
+@ndb.tasklet
+def token_domains_async(token):
+  """Returns the ids of the domains registered for a token.
+
+  Uses :attr:`token_domains_cache` if possible, otherwise queries the datastore.
+
+  Args:
+    token (str)
+
+  Returns:
+    ndb.Future: resolves to tuple of str domain ids, possibly empty
+  """
+  if not token:
+    return ()
+
+  with token_domains_cache_lock:
+    domains = token_domains_cache.get(token)
+
+  if domains is None:
+    keys = yield Domain.query(Domain.tokens == token).fetch_async(keys_only=True)
+    domains = tuple(key.id() for key in keys)
+    if domains:
+      with token_domains_cache_lock:
+        token_domains_cache[token] = domains
+
+  return domains
+
+
+def forget_token_domains(token):
+  """Drops a token's cached domains, eg after a new domain is added to it.
+
+  Args:
+    token (str)
+  """
+  with token_domains_cache_lock:
+    token_domains_cache.pop(token, None)
 
 
 class BrowserSource(Source):
@@ -126,8 +202,7 @@ class BrowserSource(Source):
     """Uses the activity passed in the activity kwarg."""
     if activity:
       for reply in activity.get('object', {}).get('replies', {}).get('items', []):
-        parsed = util.parse_tag_uri(reply.get('id', ''))
-        if parsed and parsed[1] == comment_id:
+        if tag_uri_has_id(reply.get('id', ''), comment_id):
           return reply
 
   def get_like(self, activity_user_id, activity_id, like_user_id, activity=None,
@@ -135,21 +210,32 @@ class BrowserSource(Source):
     """Uses the activity passed in the activity kwarg."""
     if activity:
       for tag in activity.get('object', {}).get('tags', []):
-        if tag.get('verb') == 'like':
-          parsed = util.parse_tag_uri(tag.get('author', {}).get('id', ''))
-          if parsed and parsed[1] == like_user_id:
-            return tag
+        if (tag.get('verb') == 'like' and
+            tag_uri_has_id(tag.get('author', {}).get('id', ''), like_user_id)):
+          return tag
 
 
 class BrowserView(View):
-  """Base class for requests from the browser extension."""
+  """Base class for requests from the browser extension.
+
+  Instances are bound to a single source class by :func:`route` and shared
+  across requests, so they shouldn't store any per-request state.
+
+  Attributes:
+    source_cls (type): :class:`BrowserSource` subclass
+  """
+  init_every_request = False
+
+  def __init__(self, source_cls):
+    self.source_cls = source_cls
+
   def source_class(self):
-    return models.sources.get(request.path.strip('/').split('/')[0])
+    return self.source_cls
 
   def gr_source(self):
-    return self.source_class().gr_source
+    return self.source_cls.gr_source
 
-  def check_token(self, load_source=True):
+  def check_token(self):
     """Loads the token and checks that it has at least one domain registered.
 
     Expects token in the ``token`` query param.
@@ -157,18 +243,49 @@ class BrowserView(View):
     Raises (HTTPException): HTTP 403 if the token is missing or invalid
     """
     token = request.values['token']
-    domains = Domain.query(Domain.tokens == token).fetch()
-    logger.info(f'Found domains for token {token}: {domains}')
-    if not domains:
-      self.error(f'No domains found for token {token}. Click Reconnect to Bridgy above to register your domain!', 403)
+    self._check_domains(token, token_domains_async(token).get_result())
 
   def auth(self):
     """Checks token and loads and returns the source.
 
+    Starts loading the source while the token's domain query is in flight, so
+    that the two datastore round trips overlap, but checks the token before
+    looking at or reporting anything about the source.
+
     Raises (HTTPException): HTTP 400 or 403
     """
-    self.check_token()
-    return util.load_source(error_fn=self.error)
+    token = request.values['token']
+    domains_future = token_domains_async(token)
+    source_future = util.load_source_async(error_fn=self.error)
+
+    self._check_domains(token, domains_future.get_result())
+    return source_future.get_result()
+
+  def _check_domains(self, token, domains):
+    """Raises HTTP 403 if a token has no registered domains.
+
+    Args:
+      token (str)
+      domains (sequence of str): domain ids registered for the token
+
+    Raises (HTTPException): HTTP 403 if ``domains`` is empty
+    """
+    logger.info(f'Found domains for token {token}: {domains}')
+    if not domains:
+      self.error(f'No domains found for token {token}. Click Reconnect to Bridgy above to register your domain!', 403)
+
+  @staticmethod
+  def output(obj):
+    """Returns a JSON response for the browser extension.
+
+    Compact by default, since the extension parses it programmatically. Pretty
+    printed if the ``pretty`` query param is ``true``, ``1``, or ``yes``, for
+    humans debugging.
+    """
+    pretty = request.values.get('pretty', '').lower() in ('true', '1', 'yes')
+    kwargs = {'indent': 2} if pretty else {}
+    return make_response(json_dumps(obj, **kwargs),
+                         {'Content-Type': JSON_CONTENT_TYPE})
 
   @staticmethod
   def error(msg, status=400):
@@ -192,7 +309,7 @@ class Status(BrowserView):
       'poll-seconds': source.poll_period().total_seconds(),
     }
     logger.info(f'Returning {out}')
-    return out
+    return self.output(out)
 
 
 class Homepage(BrowserView):
@@ -209,7 +326,7 @@ class Homepage(BrowserView):
       username = actor.get('username')
       if username:
         logger.info(f'Returning {username}')
-        return jsonify(username)
+        return self.output(username)
 
     self.error(f"Scrape error: couldn't determine logged in {gr_src.NAME} user or username")
 
@@ -225,7 +342,7 @@ class Feed(BrowserView):
   def dispatch_request(self):
     self.auth()
     activities, _ = self.scrape()
-    return jsonify(activities)
+    return self.output(activities)
 
   def scrape(self):
     gr_src = self.gr_source()
@@ -248,6 +365,10 @@ class Profile(Feed):
   Response body is the JSON string URL-safe key of the Bridgy source entity.
   """
   def dispatch_request(self):
+    # check the token first, since it's cheap, and scraping and resolving the
+    # actor's profile URLs isn't
+    self.check_token()
+
     _, actor = self.scrape()
     if not actor:
       actor = self.gr_source().scraped_to_actor(request.get_data(as_text=True))
@@ -258,8 +379,6 @@ class Profile(Feed):
     if not as1.is_public(actor):
       self.error(f'Your {self.gr_source().NAME} account is private. Bridgy only supports public accounts.')
 
-    self.check_token()
-
     # use temporary source instance to get only non-silo, non-blocklisted
     # profile URLs from actor
     src = self.source_class().new(actor=actor)
@@ -268,7 +387,7 @@ class Profile(Feed):
 
     # create/update the Bridgy account
     source = self.source_class().create_new(self, actor=actor)
-    return jsonify(source.key.urlsafe().decode())
+    return self.output(source.key.urlsafe().decode())
 
 
 class Post(BrowserView):
@@ -282,25 +401,30 @@ class Post(BrowserView):
     source = self.auth()
 
     gr_src = self.gr_source()
-    new_activity, actor = gr_src.scraped_to_activity(request.get_data(as_text=True))
+    html = request.get_data(as_text=True)
+    new_activity, actor = gr_src.scraped_to_activity(html)
     if not new_activity:
       self.error(f'Scrape error: no {gr_src.NAME} post found in HTML')
 
-    @ndb.transactional()
+    id = new_activity.get('id')
+    if not id:
+      self.error('Scrape error: post missing id')
+
+    @ndb.transactional_tasklet()
     def update_activity():
-      id = new_activity.get('id')
-      if not id:
-        self.error('Scrape error: post missing id')
-      activity = Activity.get_by_id(id)
+      activity = yield Activity.get_by_id_async(id)
 
       if activity:
-        # we already have this activity! merge in any new comments and likes
-        merged_activity = copy.deepcopy(new_activity)
-        merged_obj = merged_activity.setdefault('object', {})
+        # we already have this activity! merge in any new comments and likes.
+        # new_activity is returned as is, so shallow copy just the dicts along
+        # the path we modify instead of deep copying the whole thing.
+        # as1.merge_by_id replaces the lists, so it doesn't modify them.
+        merged_activity = dict(new_activity)
+        merged_obj = merged_activity['object'] = dict(new_activity.get('object', {}))
         existing_activity = json_loads(activity.activity_json)
         existing_obj = existing_activity.get('object', {})
 
-        replies = merged_obj.setdefault('replies', {})
+        replies = merged_obj['replies'] = dict(merged_obj.get('replies', {}))
         as1.merge_by_id(replies, 'items',
                         existing_obj.get('replies', {}).get('items', []))
         replies['totalItems'] = len(replies.get('items', []))
@@ -308,16 +432,15 @@ class Post(BrowserView):
         activity.activity_json = json_dumps(merged_activity)
 
       else:
-        activity = Activity(id=id, source=source.key,
-                            html=request.get_data(as_text=True),
+        activity = Activity(id=id, source=source.key, html=html,
                             activity_json=json_dumps(new_activity))
 
       # store and return the activity
-      activity.put()
+      yield activity.put_async()
       logger.info(f"Stored activity {id}")
 
-    update_activity()
-    return new_activity
+    update_activity().get_result()
+    return self.output(new_activity)
 
 
 class Extras(BrowserView):
@@ -364,7 +487,7 @@ class Extras(BrowserView):
 
     extra_ids = ' '.join(c['id'] for c in new_extras)
     logger.info(f"Stored extras for activity {id}: {extra_ids}")
-    return jsonify(new_extras)
+    return self.output(new_extras)
 
 
 class Comments(Extras):
@@ -388,11 +511,16 @@ class Reactions(Extras):
 
 
 class Poll(BrowserView):
-  """Triggers a poll for a browser-based account."""
+  """Triggers a poll for a browser-based account.
+
+  Adds the poll task after the response is sent, so that the browser extension
+  doesn't wait on the Cloud Tasks API call.
+  """
   def dispatch_request(self):
     source = self.auth()
-    util.add_poll_task(source, now=True)
-    return jsonify('OK')
+    resp = self.output('OK')
+    resp.call_on_close(lambda: util.add_poll_task(source, now=True))
+    return resp
 
 
 class TokenDomains(BrowserView):
@@ -400,12 +528,12 @@ class TokenDomains(BrowserView):
   def dispatch_request(self):
     token = request.values['token']
 
-    domains = [d.key.id() for d in Domain.query(Domain.tokens == token)]
+    domains = list(token_domains_async(token).get_result())
     if not domains:
       indieauth_start = util.host_url(f'/indieauth/start?token={token}')
       self.error(f'Not connected to Bridgy. <a href="{indieauth_start}" target="_blank"">Connect now!</a>', 404)
 
-    return jsonify(domains)
+    return self.output(domains)
 
 
 def route(source_cls):
@@ -425,5 +553,5 @@ def route(source_cls):
       (f'/{source_cls.SHORT_NAME}/browser/poll', Poll),
       (f'/{source_cls.SHORT_NAME}/browser/token-domains', TokenDomains),
     ):
-    app.add_url_rule(route, view_func=cls.as_view(route),
+    app.add_url_rule(route, view_func=cls.as_view(route, source_cls),
                      methods=['GET', 'POST'] if cls == Status else ['POST'])
@@ -251,9 +251,10 @@ class Comment(Item):
       if resp and resp.response_json:
         cmt = json_loads(resp.response_json)
         if resp.activities_json:
+          post_tag_uri = self.source.gr_source.tag_uri(post_id)
           for activity in resp.activities_json:
             activity = json_loads(activity)
-            if activity.get('id') == self.source.gr_source.tag_uri(post_id):
+            if activity.get('id') == post_tag_uri:
               post = activity
 
     else:
@@ -305,9 +306,10 @@ class Repost(Item):
       if resp and resp.response_json:
         repost = json_loads(resp.response_json)
         if resp.activities_json:
+          post_tag_uri = self.source.gr_source.tag_uri(post_id)
           for activity in resp.activities_json:
             activity = json_loads(activity)
-            if activity.get('id') == self.source.gr_source.tag_uri(post_id):
+            if activity.get('id') == post_tag_uri:
               post = activity
 
     else:
@@ -5,6 +5,7 @@ from oauth_dropins import indieauth
 from oauth_dropins.webutil.flask_util import flash
 
 from flask_app import app
+import browser
 from models import Domain
 import util
 from util import redirect
@@ -51,6 +52,7 @@ class Callback(indieauth.Callback):
       flash(f'Authorized you for {domain.key.id()}.')
 
     add_or_update_domain()
+    browser.forget_token_domains(state)
     return redirect('/')
 
 
@@ -690,7 +690,8 @@ class Source(StringIdModel, metaclass=SourceMeta):
     """
     if not actor:
       actor = self.gr_source.user_to_actor(json_loads(auth_entity.user_json))
-    logger.debug(f'Extracting URLs and domains from actor: {json_dumps(actor, indent=2)}')
+    if logger.isEnabledFor(logging.DEBUG):
+      logger.debug(f'Extracting URLs and domains from actor: {json_dumps(actor, indent=2)}')
 
     candidates = util.trim_nulls(util.uniquify(
         [user_url] + as1.object_urls(actor)))
@@ -698,9 +699,10 @@ class Source(StringIdModel, metaclass=SourceMeta):
     if len(candidates) > MAX_AUTHOR_URLS:
       logger.info(f'Too many profile links! Only resolving the first {MAX_AUTHOR_URLS}: {candidates}')
 
+    source_domain = self.gr_source.DOMAIN
     urls = []
     for i, url in enumerate(candidates):
-      on_source_domain = util.domain_from_link(url) == self.gr_source.DOMAIN
+      on_source_domain = util.domain_from_link(url) == source_domain
       resolve = ((resolve_source_domain or not on_source_domain) and
                  i < MAX_AUTHOR_URLS)
       resolved = self.resolve_profile_url(url, resolve=resolve)
@@ -713,7 +715,7 @@ class Source(StringIdModel, metaclass=SourceMeta):
       # skip links on this source's domain itself. only currently needed for
       # Mastodon; the other silo domains are in the webmention blocklist.
       domain = util.domain_from_link(url)
-      if domain != self.gr_source.DOMAIN:
+      if domain != source_domain:
         final_urls.append(url)
         domains.append(domain)
 
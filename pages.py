@@ -1,9 +1,12 @@
 """Bridgy user-facing pages: front page, user pages, delete POSTs, etc."""
+import copy
 import datetime
 import itertools
 import logging
+import threading
 import urllib.request, urllib.parse, urllib.error
 
+from cachetools import cached, TTLCache
 from flask import render_template, request
 from google.cloud import ndb
 from granary import as1
@@ -33,6 +36,14 @@ SITES = ','.join(list(models.sources.keys()) + ['fake'])  # for unit tests
 
 RECENT_PRIVATE_POSTS_THRESHOLD = 5
 
+USERS_PAGE_SIZE = 50
+
+# start_name => list of Sources for the /users page, so that anonymous hits
+# don't each run a query per silo. short TTL so that new and disabled users
+# show up soon.
+users_cache_lock = threading.RLock()
+users_cache = TTLCache(100, 10)  # 10s expiration
+
 
 @app.route('/', methods=['HEAD'])
 @app.route('/users', methods=['HEAD'])
@@ -70,26 +81,43 @@ def users():
 
   Semi-optimized. Pages by source name. Queries each source type for results
   with name greater than the start_name query param, then merge sorts the
-  results and truncates at ``PAGE_SIZE``\.
+  results and truncates at ``USERS_PAGE_SIZE``\.
 
   The start_name param is expected to be capitalized because capital letters
   sort lexicographically before lower case letters. An alternative would be to
   store a lower cased version of the name in another property and query on that.
   """
-  PAGE_SIZE = 50
-
   start_name = request.values.get('start_name', '')
-  queries = [cls.query(cls.name >= start_name).fetch_async(PAGE_SIZE)
+  # preprocess_source modifies the entity based on this request, so copy the
+  # cached entities first
+  sources = [util.preprocess_source(copy.deepcopy(s))
+             for s in users_page_sources(start_name)]
+  return render_template('users.html', PAGE_SIZE=USERS_PAGE_SIZE,
+                         sources=sources)
+
+
+@cached(users_cache, lock=users_cache_lock)
+def users_page_sources(start_name):
+  """Returns the sources to show on a ``/users`` page.
+
+  Callers shouldn't modify the returned entities, since they're cached and
+  shared across requests.
+
+  Args:
+    start_name (str)
+
+  Returns:
+    list of :class:`models.Source`
+  """
+  queries = [cls.query(cls.name >= start_name).fetch_async(USERS_PAGE_SIZE)
              for cls in models.sources.values()]
 
   sources = sorted(itertools.chain(*[q.get_result() for q in queries]),
                    key=lambda s: (s.name.lower(), s.GR_CLASS.NAME))
-  sources = [util.preprocess_source(s) for s in sources
-             if s.name.lower() >= start_name.lower() and s.features
-                and s.status != 'disabled'
-             ][:PAGE_SIZE]
-
-  return render_template('users.html', PAGE_SIZE=PAGE_SIZE, sources=sources)
+  return [s for s in sources
+          if s.name.lower() >= start_name.lower() and s.features
+             and s.status != 'disabled'
+          ][:USERS_PAGE_SIZE]
 
 
 @app.route(f'/<any({SITES}):site>/<id>')
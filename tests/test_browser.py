@@ -35,6 +35,22 @@ class BrowserSourceTest(testutil.AppTest):
     self.source = FakeBrowserSource.new(actor=self.actor)
     FakeBrowserSource.gr_source.actor = {}
 
+  def test_merge_by_id(self):
+    existing = [{'id': 'b', 'x': 1}, {'id': 'a', 'x': 2}]
+    updates = [{'id': 'c', 'x': 3}, {'id': 'b', 'x': 4}]
+
+    self.assertEqual([{'id': 'a', 'x': 2}, {'id': 'b', 'x': 4}, {'id': 'c', 'x': 3}],
+                     browser.merge_by_id(existing, updates))
+    self.assertEqual([{'id': 'b', 'x': 4}, {'id': 'a', 'x': 2}, {'id': 'c', 'x': 3}],
+                     browser.merge_by_id(existing, updates, sort=False))
+
+  def test_tag_uri_has_id(self):
+    self.assertTrue(browser.tag_uri_has_id('tag:fa.ke,2013:1_2_a', '1_2_a'))
+    self.assertFalse(browser.tag_uri_has_id('tag:fa.ke,2013:1_2_a', '2_a'))
+    self.assertFalse(browser.tag_uri_has_id('tag:fa.ke,2013:x:2_a', '2_a'))
+    self.assertFalse(browser.tag_uri_has_id('not a tag uri:2_a', '2_a'))
+    self.assertFalse(browser.tag_uri_has_id('', '2_a'))
+
   def test_new_missing_key_id_field(self):
     del self.actor['fbs_id']
     with self.assertRaises(BadRequest):
@@ -106,6 +122,7 @@ class BrowserViewTest(testutil.AppTest):
   def setUp(self):
     super().setUp()
 
+    browser.token_domains_cache.clear()
     self.domain = Domain(id='snarfed.org', tokens=['towkin']).put()
     FakeBrowserSource.gr_source = FakeGrSource()
     self.actor['fbs_id'] = '222yyy'
@@ -288,6 +305,12 @@ class BrowserViewTest(testutil.AppTest):
     self.assertEqual(403, resp.status_code, resp.get_data(as_text=True))
     self.assertIn('No domains found for token nope', resp.get_data(as_text=True))
 
+  def test_feed_bad_token_and_key(self):
+    for query in 'token=nope', 'token=nope&key=asdf':
+      resp = self.post(f'feed?{query}')
+      self.assertEqual(403, resp.status_code, resp.get_data(as_text=True))
+      self.assertIn('No domains found for token nope', resp.get_data(as_text=True))
+
   def test_feed_missing_key(self):
     resp = self.post('feed?token=towkin')
     self.assertEqual(400, resp.status_code, resp.get_data(as_text=True))
@@ -483,6 +506,8 @@ class BrowserViewTest(testutil.AppTest):
     resp = self.post('poll')
     self.assertEqual(200, resp.status_code, resp.get_data(as_text=True))
     self.assertEqual('OK', resp.json)
+    # the task is added when the response is closed, ie after it's sent
+    resp.close()
 
   def test_poll_missing_token(self):
     resp = self.post(f'poll?key={self.source.urlsafe().decode()}')
@@ -506,6 +531,28 @@ class BrowserViewTest(testutil.AppTest):
     self.assertEqual(200, resp.status_code)
     self.assertEqual(['snarfed.org'], resp.json)
 
+  def test_token_domains_pretty(self):
+    resp = self.post('token-domains?token=towkin')
+    self.assertEqual('["snarfed.org"]', resp.get_data(as_text=True))
+    self.assertEqual('application/json', resp.headers['Content-Type'])
+
+    for val in 'true', '1':
+      resp = self.post(f'token-domains?token=towkin&pretty={val}')
+      self.assertEqual('[\n  "snarfed.org"\n]', resp.get_data(as_text=True))
+
+    for val in 'false', '0':
+      resp = self.post(f'token-domains?token=towkin&pretty={val}')
+      self.assertEqual('["snarfed.org"]', resp.get_data(as_text=True))
+
+  def test_token_domains_cached(self):
+    resp = self.post('token-domains?token=towkin')
+    self.assertEqual(['snarfed.org'], resp.json)
+
+    self.domain.delete()
+    resp = self.post('token-domains?token=towkin')
+    self.assertEqual(200, resp.status_code)
+    self.assertEqual(['snarfed.org'], resp.json)
+
   def test_token_domains_missing(self):
     resp = self.post('token-domains?token=unknown')
     self.assertEqual(404, resp.status_code)
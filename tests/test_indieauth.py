@@ -9,6 +9,7 @@ from oauth_dropins.webutil.util import json_dumps, json_loads
 from oauth_dropins import indieauth
 import requests
 
+import browser
 import indieauth as _  # just need to register the endpoints
 from models import Domain
 from . import testutil
@@ -20,6 +21,7 @@ class IndieAuthTest(testutil.AppTest):
   def setUp(self):
     super().setUp()
     self.auth_entity = indieauth.IndieAuth(id='http://snarfed.org')
+    browser.token_domains_cache.clear()
 
   def expect_indieauth_check(self):
     return TestCase.expect_requests_post(
@@ -63,6 +65,19 @@ class IndieAuthTest(testutil.AppTest):
       Domain(id='snarfed.org', tokens=['towkin'], auth=self.auth_entity.key),
     ], Domain.query().fetch(), ignore=('created', 'updated'))
 
+  def test_callback_clears_token_domains_cache(self):
+    Domain(id='other.org', tokens=['towkin']).put()
+    self.assertEqual(('other.org',),
+                     browser.token_domains_async('towkin').get_result())
+
+    self.expect_indieauth_check()
+    self.expect_site_fetch()
+    self.mox.ReplayAll()
+    self.callback()
+
+    self.assertCountEqual(['other.org', 'snarfed.org'],
+                          browser.token_domains_async('towkin').get_result())
+
   def test_start_get(self):
     resp = self.client.get('/indieauth/start?token=foo')
     self.assertEqual(200, resp.status_code)
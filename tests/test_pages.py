@@ -34,6 +34,7 @@ class PagesTest(testutil.AppTest):
   def setUp(self):
     super().setUp()
     self.sources[0].put()
+    pages.users_cache.clear()
 
   def test_front_page(self):
     resp = self.client.get('/')
@@ -526,6 +527,31 @@ class PagesTest(testutil.AppTest):
         f'<a href="{entity.bridgy_path()}" title="{entity.label()}"',
         resp.get_data(as_text=True))
 
+  def test_users_page_cached(self):
+    link = f'<a href="{self.sources[1].bridgy_path()}"'
+
+    resp = self.client.get('/users')
+    self.assertNotIn(link, resp.get_data(as_text=True))
+
+    self.sources[1].put()
+    resp = self.client.get('/users')
+    self.assertNotIn(link, resp.get_data(as_text=True))
+
+    pages.users_cache.clear()
+    resp = self.client.get('/users')
+    self.assertIn(link, resp.get_data(as_text=True))
+
+  def test_users_page_cached_picture_scheme_per_request(self):
+    source = self.sources[0].key.get()
+    source.picture = 'http://pic/ture'
+    source.put()
+
+    resp = self.client.get('/users', base_url='https://localhost/')
+    self.assertIn('src="https://pic/ture"', resp.get_data(as_text=True))
+
+    resp = self.client.get('/users')
+    self.assertIn('src="http://pic/ture"', resp.get_data(as_text=True))
+
   def test_logout(self):
     util.now = lambda: datetime(2000, 1, 1, tzinfo=timezone.utc)
     resp = self.client.get('/logout')
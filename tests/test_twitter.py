@@ -22,6 +22,7 @@ class TwitterTest(testutil.AppTest):
 
   def setUp(self):
     super().setUp()
+    twitter.like_cache.clear()
     oauth_dropins.twitter.TWITTER_APP_KEY = 'my_app_key'
     oauth_dropins.twitter.TWITTER_APP_SECRET = 'my_app_secret'
     self.auth_entity = oauth_dropins.twitter.TwitterAuth(
@@ -68,6 +69,29 @@ class TwitterTest(testutil.AppTest):
                     response_json=json_dumps(like)).put()
     self.assert_equals(like, self.tw.get_like('unused', '000', '222'))
 
+  def test_get_like_cached(self):
+    like = {
+      'objectType': 'activity',
+      'verb': 'like',
+      'id': 'tag:twitter.com,2013:222',
+      'object': {'url': 'http://my/favorite'},
+      }
+    resp = models.Response(id='tag:twitter.com,2013:000_favorited_by_222',
+                           response_json=json_dumps(like))
+    resp.put()
+    self.assert_equals(like, self.tw.get_like('unused', '000', '222'))
+
+    resp.key.delete()
+    self.assert_equals(like, self.tw.get_like('unused', '000', '222'))
+
+  def test_get_like_miss_not_cached(self):
+    self.assertIsNone(self.tw.get_like('unused', '000', '222'))
+
+    like = {'objectType': 'activity', 'verb': 'like'}
+    models.Response(id='tag:twitter.com,2013:000_favorited_by_222',
+                    response_json=json_dumps(like)).put()
+    self.assert_equals(like, self.tw.get_like('unused', '000', '222'))
+
   def test_get_like_fallback(self):
     """If there's no Response in the datastore, fall back to get_activities."""
     models.TWITTER_SCRAPE_HEADERS = {'x': 'y'}
@@ -189,6 +189,17 @@ class UtilTest(testutil.AppTest):
       ):
       self.assert_equals(expected, util.prune_activity(orig, self.sources[0]))
 
+  def test_prune_response(self):
+    for orig, expected in (
+      ({'id': 1, 'tags': [{'x': 'y'}], 'replies': {'items': []}}, {'id': 1}),
+      ({'id': 1, 'object': {'id': 2, 'activity': {'id': 3}}},
+       {'id': 1, 'object': {'id': 2}}),
+      ({'object': {'object': {'id': 3, 'mentions': ['x']}, 'originals': ['y']}},
+       {'object': {'object': {'id': 3}}}),
+      ({'id': 1, 'object': {'tags': []}}, {'id': 1}),
+      ):
+      self.assert_equals(expected, util.prune_response(orig))
+
   def test_get_webmention_target_blocklisted_urls(self):
     for resolve in True, False:
       self.assertTrue(util.get_webmention_target(
@@ -197,6 +208,32 @@ class UtilTest(testutil.AppTest):
                   'http://sub.dom.ain.facebook.com/z'):
         self.assertFalse(util.get_webmention_target(bad, resolve=resolve)[2], bad)
 
+  def test_get_webmention_target_blocklisted_redirects(self):
+    """Blocklisted URLs that redirect to other sites should still resolve."""
+    urls = ('http://bit.ly/abc',
+            'https://www.facebook.com/l.php?u=http%3A%2F%2Ffinal%2Fpost',
+            'https://www.youtube.com/redirect?q=http%3A%2F%2Ffinal%2Fpost',
+            'https://medium.com/@me/a-post-123',
+            'https://l.instagram.com/?u=http%3A%2F%2Ffinal%2Fpost')
+    for url in urls:
+      self.expect_requests_head(url, redirected_url='http://final/post')
+    self.mox.ReplayAll()
+
+    for url in urls:
+      self.assert_equals(('http://final/post', 'final', True),
+                         util.get_webmention_target(url), url)
+
+  def test_get_webmention_target_non_redirecting_silo_not_fetched(self):
+    self.expect_requests_head('http://good.com/a')
+    self.mox.ReplayAll()
+
+    self.assert_equals(('http://good.com/a', 'good.com', True),
+                       util.get_webmention_target('http://good.com/a'))
+    self.assert_equals(('https://twitter.com/me/status/123', 'twitter.com', False),
+                       util.get_webmention_target('https://twitter.com/me/status/123'))
+    self.assert_equals(('https://www.instagram.com/p/abc/', 'instagram.com', False),
+                       util.get_webmention_target('https://www.instagram.com/p/abc/'))
+
   def test_get_webmention_cleans_redirected_urls(self):
     self.expect_requests_head('http://foo/bar',
                               redirected_url='http://final?utm_source=x')
@@ -295,10 +332,10 @@ class UtilTest(testutil.AppTest):
     util.requests_get('http://rhiaro.co.uk/')
 
   def test_in_webmention_blocklist(self):
-    for bad in 't.co', 'x.t.co', 'X.Y.T.CO', 'abc.onion':
+    for bad in 't.co', 'x.t.co', 'X.Y.T.CO', 'a.b.c.d.t.co', 'abc.onion':
       self.assertTrue(util.in_webmention_blocklist(bad), bad)
 
-    for good in 'snarfed.org', 'www.snarfed.org', 't.co.com':
+    for good in 'snarfed.org', 'www.snarfed.org', 't.co.com', 'xt.co', '':
       self.assertFalse(util.in_webmention_blocklist(good), good)
 
     self.mox.StubOutWithMock(appengine_info, 'LOCAL_SERVER')
@@ -307,6 +344,22 @@ class UtilTest(testutil.AppTest):
     appengine_info.LOCAL_SERVER = True
     self.assertFalse(util.in_webmention_blocklist('localhost'))
 
+  def test_replace_test_domains_with_localhost(self):
+    self.mox.StubOutWithMock(appengine_info, 'LOCAL_SERVER')
+    appengine_info.LOCAL_SERVER = True
+    for expected, url in (
+        ('http://localhost/post', 'https://snarfed.org/post'),
+        ('http://redwind.dev/a?b=http://localhost', 'http://kylewm.com/a?b=https://snarfed.org'),
+        ('https://snarfedxorg/', 'https://snarfedxorg/'),
+        ('http://other.com/', 'http://other.com/'),
+        (None, None),
+    ):
+      self.assertEqual(expected, util.replace_test_domains_with_localhost(url))
+
+    appengine_info.LOCAL_SERVER = False
+    self.assertEqual('https://snarfed.org/post',
+                     util.replace_test_domains_with_localhost('https://snarfed.org/post'))
+
   def test_is_opt_out(self):
     for actor, expected in [
       ({'summary': 'I like this'}, False),
@@ -357,6 +410,23 @@ class UtilTest(testutil.AppTest):
     with app.test_request_context(query_string=f'key={key}'):
       self.assert_entities_equal(self.sources[0], util.load_source())
 
+  def test_load_source_async(self):
+    with app.test_request_context(query_string='key=SELECT FOO'):
+      # errors are raised from the future, not the call
+      future = util.load_source_async()
+      with self.assertRaises(BadRequest):
+        future.get_result()
+
+    self.sources[0].put()
+    key = self.sources[0].key.urlsafe().decode()
+    with app.test_request_context(query_string=f'source_key=asdf&key={key}'):
+      with self.assertRaises(BadRequest):
+        util.load_source_async().get_result()
+
+    with app.test_request_context(query_string=f'key={key}'):
+      self.assert_entities_equal(self.sources[0],
+                                 util.load_source_async().get_result())
+
 
 class RegistrationCallbackTest(testutil.AppTest):
 
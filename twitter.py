@@ -3,7 +3,9 @@
 The Twitter API is dead, and so is this code.
 """
 import logging
+import threading
 
+from cachetools import TTLCache
 from flask import request
 from granary import twitter as gr_twitter
 from granary import source as gr_source
@@ -17,6 +19,11 @@ import util
 
 logger = logging.getLogger(__name__)
 
+# maps like tag URI to Response.response_json. stores the JSON string, not the
+# parsed dict, since callers modify the returned like.
+like_cache_lock = threading.RLock()
+like_cache = TTLCache(8192, 60 * 5)  # 5m expiration
+
 
 class Twitter(models.Source):
   """A Twitter account.
@@ -52,14 +59,30 @@ class Twitter(models.Source):
     assert 'username' not in kwargs
     assert 'id' not in kwargs
     user = json_loads(auth_entity.user_json)
-    gr_source = gr_twitter.Twitter(*auth_entity.access_token())
+    gr_source = gr_twitter.Twitter(*auth_entity.access_token(),
+                                   username=user['screen_name'].lower())
     actor = gr_source.user_to_actor(user)
-    return Twitter(username=user['screen_name'],
-                   auth_entity=auth_entity.key,
-                   url=actor.get('url'),
-                   name=actor.get('displayName'),
-                   picture=actor.get('image', {}).get('url'),
-                   **kwargs)
+    twitter = Twitter(username=user['screen_name'],
+                      auth_entity=auth_entity.key,
+                      url=actor.get('url'),
+                      name=actor.get('displayName'),
+                      picture=actor.get('image', {}).get('url'),
+                      **kwargs)
+    # so that Source.__getattr__ doesn't load the auth entity and make another
+    # granary source, and urls_and_domains() doesn't re-parse user_json
+    twitter.gr_source = gr_source
+    twitter._actor = actor
+    return twitter
+
+  def urls_and_domains(self, auth_entity, user_url, actor=None, **kwargs):
+    """Uses the actor from :meth:`new`, if available.
+
+    Otherwise, :meth:`models.Source.urls_and_domains` would parse
+    ``auth_entity.user_json`` and convert it to an actor all over again.
+    """
+    if not actor:
+      actor = getattr(self, '_actor', None)
+    return super().urls_and_domains(auth_entity, user_url, actor=actor, **kwargs)
 
   def silo_url(self):
     """Returns the Twitter account URL, e.g. https://twitter.com/foo."""
@@ -115,7 +138,8 @@ class Twitter(models.Source):
 
     We get Twitter favorites by scraping HTML, and we only get the first page,
     which only has 25. So, use a :class:`models.Response` in the datastore
-    first, if we have one, and only re-scrape HTML as a fallback.
+    first, if we have one, and only re-scrape HTML as a fallback. Caches
+    those :class:`models.Response` in memory in :attr:`like_cache`.
 
     Args:
       activity_user_id (str): id of the user who posted the original activity
@@ -124,9 +148,18 @@ class Twitter(models.Source):
       kwargs: passed to :meth:`granary.source.Source.get_comment`
     """
     id = self.gr_source.tag_uri(f'{activity_id}_favorited_by_{like_user_id}')
-    resp = models.Response.get_by_id(id)
-    if resp:
-      return json_loads(resp.response_json)
+    with like_cache_lock:
+      like_json = like_cache.get(id)
+
+    if like_json is None:
+      resp = models.Response.get_by_id(id)
+      if not resp:
+        return None
+      like_json = resp.response_json
+      with like_cache_lock:
+        like_cache[id] = like_json
+
+    return json_loads(like_json)
 
   def is_private(self):
     """Returns True if this Twitter account is protected.
@@ -3,6 +3,7 @@ import binascii
 import collections
 import copy
 from datetime import datetime, timedelta, timezone
+import functools
 import logging
 import os
 import random
@@ -10,7 +11,7 @@ import re
 import threading
 import urllib.request, urllib.parse, urllib.error
 
-from cachetools import TTLCache
+from cachetools import cached, TTLCache
 import flask
 from flask import request
 from google.cloud import ndb
@@ -29,6 +30,7 @@ from oauth_dropins.webutil.flask_util import error, flash
 from oauth_dropins.webutil import util
 from oauth_dropins.webutil.util import *
 import requests
+from werkzeug.http import http_date
 from werkzeug.routing import RequestRedirect
 
 logger = logging.getLogger(__name__)
@@ -38,6 +40,9 @@ LOCALHOST_TEST_DOMAINS = frozenset([
   ('snarfed.org', 'localhost'),
   ('kylewm.com', 'redwind.dev'),
 ])
+_LOCALHOST_TEST_DOMAINS_MAP = dict(LOCALHOST_TEST_DOMAINS)
+_LOCALHOST_TEST_DOMAINS_RE = re.compile(r'https?://(%s)' % '|'.join(
+  re.escape(domain) for domain in _LOCALHOST_TEST_DOMAINS_MAP))
 
 LOCAL_HOSTS = {'localhost', '127.0.0.1'}
 
@@ -58,6 +63,19 @@ _dir = os.path.dirname(__file__)
 with open(os.path.join(_dir, 'domain_blocklist.txt'), 'rt', encoding='utf-8') as f:
   BLOCKLIST = util.load_file_lines(f)
 
+# Blocklisted silo domains that get_webmention_target doesn't bother fetching.
+# They may redirect, eg twitter.com to x.com, but only to other silo URLs that
+# we'd never send webmentions to either. Exact matches only, since subdomains
+# are often link shims, eg l.instagram.com. Most other blocklisted domains, eg
+# URL shorteners, medium.com, and facebook.com's l.php, can redirect to sites
+# we do send to.
+NON_REDIRECTING_DOMAINS = frozenset((
+  'flickr.com',
+  'github.com',
+  'instagram.com',
+  'twitter.com',
+))
+
 # Individual URLs that we shouldn't fetch. Started because of
 # https://github.com/snarfed/bridgy/issues/525 . Hopefully temporary and can be
 # removed once https://github.com/idno/Known/issues/1088 is fixed!
@@ -86,6 +104,7 @@ HTTP_REQUEST_REFUSED_STATUS_CODE = 599
 
 # Unpacked representation of logged in account in the logins cookie.
 Login = collections.namedtuple('Login', ('site', 'name', 'path'))
+LOGINS_COOKIE_MAX_AGE = timedelta(days=365 * 2)
 
 HOST_URL = 'https://brid.gy'
 PRIMARY_DOMAIN = 'brid.gy'
@@ -191,13 +210,24 @@ class Redirect(RequestRedirect):
          for login in self.logins}))
 
       logger.info(f'setting logins cookie: {cookie}')
-      age = timedelta(days=365 * 2)
-      expires = (util.now() + age).replace(microsecond=0)
-      resp.set_cookie('logins', cookie, max_age=age, expires=expires)
+      resp.set_cookie('logins', cookie, max_age=LOGINS_COOKIE_MAX_AGE,
+                      expires=logins_cookie_expires())
 
     return resp
 
 
+logins_cookie_expires_cache_lock = threading.RLock()
+logins_cookie_expires_cache = TTLCache(1, 60 * 60)  # 1h expiration
+
+@cached(logins_cookie_expires_cache, lock=logins_cookie_expires_cache_lock)
+def logins_cookie_expires():
+  """Returns the logins cookie's ``Expires`` value as an HTTP date string.
+
+  Only recomputed hourly, since it's two years out and doesn't need to be exact.
+  """
+  return http_date((util.now() + LOGINS_COOKIE_MAX_AGE).replace(microsecond=0))
+
+
 def redirect(path, code=302, logins=None):
   """Stops execution and redirects to the absolute URL for a given path.
 
@@ -215,6 +245,7 @@ def redirect(path, code=302, logins=None):
   raise rr
 
 
+@functools.lru_cache(maxsize=4096)
 def webmention_endpoint_cache_key(url):
   """Returns cache key for a cached webmention endpoint for a given URL.
 
@@ -223,12 +254,14 @@ def webmention_endpoint_cache_key(url):
   If the URL is the home page, ie path is ``/`` , the key includes a ``/`` at
   the end, so that we cache webmention endpoints for home pages separate from
   other pages. https://github.com/snarfed/bridgy/issues/701
+
+  Memoized, since it's pure and we often see the same URLs repeatedly.
   """
   domain = util.domain_from_link(url)
-  scheme = urllib.parse.urlparse(url).scheme
+  parsed = urllib.parse.urlparse(url)
 
-  parts = [scheme, domain]
-  if urllib.parse.urlparse(url).path in ('', '/'):
+  parts = [parsed.scheme, domain]
+  if parsed.path in ('', '/'):
     parts.append('/')
 
   return ' '.join(parts)
@@ -320,7 +353,7 @@ def get_webmention_target(url, resolve=True, replace_test_domains=True):
     return url, None, False
 
   send = True
-  if resolve:
+  if resolve and domain not in NON_REDIRECTING_DOMAINS:
     # this follows *all* redirects, until the end
     resolved = follow_redirects(url)
     html = (resolved.headers.get('content-type', '').split(';')[0]
@@ -340,10 +373,24 @@ def get_webmention_target(url, resolve=True, replace_test_domains=True):
 
 
 def in_webmention_blocklist(domain):
-  """Returns True if the domain or its root domain is in ``BLOCKLIST``."""
+  """Returns True if the domain or any of its parent domains is in ``BLOCKLIST``.
+
+  Checks the full domain first, then each parent, eg ``a.b.com``, then
+  ``b.com``, then ``com``, with one set lookup each, so this is O(labels in
+  domain), not O(size of ``BLOCKLIST``) like
+  :func:`oauth_dropins.webutil.util.domain_or_parent_in`. Exact matches like
+  ``facebook.com`` return after the first lookup.
+  """
   domain = domain.lower()
-  return (util.domain_or_parent_in(domain, BLOCKLIST) or
-          (not appengine_info.LOCAL_SERVER and domain in LOCAL_HOSTS))
+  if not appengine_info.LOCAL_SERVER and domain in LOCAL_HOSTS:
+    return True
+
+  while domain:
+    if domain in BLOCKLIST:
+      return True
+    _, _, domain = domain.partition('.')
+
+  return False
 
 
 def is_opt_out(actor):
@@ -374,6 +421,11 @@ def is_opt_out(actor):
   return False
 
 
+PRUNE_ACTIVITY_KEEP = ('id', 'url', 'content', 'fb_id', 'fb_object_id',
+                       'fb_object_type')
+PRUNE_ACTIVITY_KEEP_TO = PRUNE_ACTIVITY_KEEP + ('to',)
+
+
 def prune_activity(activity, source):
   """Prunes an activity down to just id, url, content, to, and object, in place.
 
@@ -391,19 +443,27 @@ def prune_activity(activity, source):
   Returns:
     dict: pruned activity
   """
-  keep = ['id', 'url', 'content', 'fb_id', 'fb_object_id', 'fb_object_type']
-  if not as1.is_public(activity):
-    keep += ['to']
-  pruned = {f: activity.get(f) for f in keep}
+  def prune(obj):
+    keep = PRUNE_ACTIVITY_KEEP if as1.is_public(obj) else PRUNE_ACTIVITY_KEEP_TO
+    return {f: obj.get(f) for f in keep}
 
+  # walk down the object chain iteratively instead of recursing. dedupe each
+  # object against its parent's fields from *before* the parent was deduped.
+  root = parent = parent_fields = prune(activity)
   obj = activity.get('object')
-  if obj:
-    obj = pruned['object'] = prune_activity(obj, source)
-    for k, v in list(obj.items()):
-      if pruned.get(k) == v:
-        del obj[k]
+  while obj:
+    fields = prune(obj)
+    parent['object'] = {k: v for k, v in fields.items()
+                        if parent_fields.get(k) != v}
+    parent = parent['object']
+    parent_fields = fields
+    obj = obj.get('object')
+
+  return trim_nulls(root)
 
-  return trim_nulls(pruned)
+
+PRUNE_RESPONSE_DROP = frozenset(('activity', 'mentions', 'originals', 'replies',
+                                 'tags'))
 
 
 def prune_response(response):
@@ -415,16 +475,23 @@ def prune_response(response):
   Returns:
     dict: pruned response object
   """
-  obj = response.get('object')
-  if obj:
-    response['object'] = prune_response(obj)
+  # walk down the object chain iteratively, then prune it bottom up
+  chain = [response]
+  while chain[-1].get('object'):
+    chain.append(chain[-1]['object'])
+
+  pruned = None
+  for obj in reversed(chain):
+    if pruned is not None:
+      obj['object'] = pruned
+    pruned = trim_nulls({k: v for k, v in obj.items()
+                         if k not in PRUNE_RESPONSE_DROP})
 
-  drop = ['activity', 'mentions', 'originals', 'replies', 'tags']
-  return trim_nulls({k: v for k, v in response.items() if k not in drop})
+  return pruned
 
 
 def replace_test_domains_with_localhost(url):
-  """Replace domains in ``LOCALHOST_TEST_DOMAINS` with localhost for testing.
+  """Replace domains in ``LOCALHOST_TEST_DOMAINS`` with localhost for testing.
 
   Args:
     url (str)
@@ -432,11 +499,11 @@ def replace_test_domains_with_localhost(url):
   Returns:
     str: url with certain well-known domains replaced by ``localhost``
   """
-  if url and appengine_info.LOCAL_SERVER:
-    for test_domain, local_domain in LOCALHOST_TEST_DOMAINS:
-      url = re.sub('https?://' + test_domain,
-                   'http://' + local_domain, url)
-  return url
+  if not (url and appengine_info.LOCAL_SERVER):
+    return url
+
+  return _LOCALHOST_TEST_DOMAINS_RE.sub(
+    lambda match: 'http://' + _LOCALHOST_TEST_DOMAINS_MAP[match.group(1)], url)
 
 
 def host_url(path_query=None):
@@ -459,7 +526,25 @@ def load_source(error_fn=None):
   Returns:
     models.Source:
   """
-  logger.debug(f'Params: {list(request.values.items())}')
+  return load_source_async(error_fn=error_fn).get_result()
+
+
+@ndb.tasklet
+def load_source_async(error_fn=None):
+  """Async version of :func:`load_source`.
+
+  Errors are raised from the returned future's ``get_result``, not when this
+  is called.
+
+  Args:
+    error_fn (callable): to be called with errors. Takes one parameter, the
+      string error message.
+
+  Returns:
+    ndb.Future: resolves to :class:`models.Source`
+  """
+  if logger.isEnabledFor(logging.DEBUG):
+    logger.debug(f'Params: {list(request.values.items())}')
   if error_fn is None:
     error_fn = error
 
@@ -468,7 +553,7 @@ def load_source(error_fn=None):
     try:
       val = request.values.get(param)
       if val:
-        source = ndb.Key(urlsafe=val).get()
+        source = yield ndb.Key(urlsafe=val).get_async()
         if source:
           logger.info(f'Got source: {source}')
           return source
@@ -526,7 +611,7 @@ def maybe_add_or_delete_source(source_cls, auth_entity, state, **kwargs):
       if callback:
         callback = util.add_query_params(callback, {'result': 'declined'})
         logger.debug(
-          f'user declined adding source, redirect to external callback {callback}')
+          'user declined adding source, redirect to external callback %s', callback)
         redirect(callback)
       else:
         redirect('/')
@@ -628,6 +713,23 @@ def get_logins():
   if not logins_str:
     return []
 
+  # callers may modify the returned list, so don't return the cached tuple
+  return list(parse_logins_cookie(logins_str))
+
+
+@functools.lru_cache(maxsize=1000)
+def parse_logins_cookie(logins_str):
+  """Parses a logins cookie value.
+
+  Memoized, since it's called on every page render, often more than once, and
+  users' logins cookies rarely change.
+
+  Args:
+    logins_str (str): logins cookie value
+
+  Returns:
+    tuple of Login:
+  """
   logins = []
   for val in set(urllib.parse.unquote_plus(logins_str).split('|')):
     parts = val.split('?', 1)
@@ -638,7 +740,7 @@ def get_logins():
     site, _ = path.strip('/').split('/')
     logins.append(Login(path=path, site=site, name=name))
 
-  return logins
+  return tuple(logins)
 
 
 def preprocess_source(source):